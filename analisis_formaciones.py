@@ -0,0 +1,226 @@
+# analisis_formaciones.py
+import numpy as np
+import pandas as pd
+
+# =========================
+# Catálogos (compartidos con app.py)
+# =========================
+FORMACIONES = [
+    "1-4-4-2 (doble contención)","1-4-4-2 (diamante)","1-4-3-3","1-4-2-3-1",
+    "1-3-5-2","1-5-3-2","1-5-4-1","Otro"
+]
+
+POSICIONES = [
+    ("POR","PORTERA"),
+    ("LAD","LATERAL DERECHA"),
+    ("LVD","LATERAL VOLANTE DERECHA"),
+    ("DCD","DEFENSA CENTRAL DERECHA"),
+    ("DCI","DEFENSA CENTRAL IZQUIERDA"),
+    ("LAI","LATERAL IZQUIERDA"),
+    ("LVI","LATERAL VOLANTE IZQUIERDA"),
+    ("MCC","MEDIOCAMPISTA CENTRAL"),
+    ("MCD","MEDIOCAMPISTA CENTRAL DEFENSIVA"),
+    ("MCO","MEDIOCAMPISTA CENTRAL OFENSIVA"),
+    ("MID","MEDIOCAMPISTA INTERIOR DERECHA"),
+    ("MII","MEDIOCAMPISTA INTERIOR IZQUIERDA"),
+    ("MVD","MEDIA VOLANTE DERECHA"),
+    ("MVI","MEDIA VOLANTE IZQUIERDA"),
+    ("EXI","EXTREMA IZQUIERDA"),
+    ("EXD","EXTREMA DERECHA"),
+    ("MEP","MEDIA PUNTA"),
+    ("DEC","DELANTERA CENTRO"),
+    ("SED","SEGUNDA DELANTERA"),
+    ("FNU","FALSA NUEVE"),
+    ("","(Sin especificar)")
+]
+POS_OPTS = [p[0] for p in POSICIONES]
+
+GANANDO, EMPATANDO, PERDIENDO = "Ganando", "Empatando", "Perdiendo"
+GAME_STATES = [GANANDO, EMPATANDO, PERDIENDO]
+TODOS = "Todos"
+
+# Ejes de cada matriz: (columna origen, columna destino, etiquetas). Los vacíos no son eje.
+TIPOS = {
+    "formacion": ("formacion_antes", "formacion_despues", FORMACIONES),
+    "posicion":  ("pos_sale", "pos_entra", [p for p in POS_OPTS if p]),
+}
+
+# Columnas mínimas por fila de cambio (df_impacto + contexto del partido)
+COLS_TEMPORADA = [
+    "partido","equipo_cambio","rival","minuto_cambio","entra","sale","game_state",
+    "formacion_antes","formacion_despues","pos_sale","pos_entra",
+    "goles_mi_equipo_post","goles_rival_post","delta_puntos",
+    "puntos_finales","gf_final","gc_final"
+]
+
+# Anotaciones que alimentan las matrices
+COLS_ANOTACION = ["formacion_antes","formacion_despues","pos_sale","pos_entra"]
+
+def tiene_anotaciones(df: pd.DataFrame) -> bool:
+    if df.empty:
+        return False
+    valores = df[COLS_ANOTACION].fillna("").astype(str)
+    return bool(valores.apply(lambda c: c.str.strip() != "").any().any())
+
+def sembrar_anotaciones(base: pd.DataFrame, guardadas: pd.DataFrame | None) -> pd.DataFrame:
+    # Rellena la tabla de anotaciones con lo ya guardado en la temporada para ese partido.
+    # Se empata por (minuto, entra, sale), que no depende de la asignación de equipos.
+    if guardadas is None or guardadas.empty:
+        return base
+    prev = (
+        guardadas.rename(columns={"minuto_cambio": "minuto"})[["minuto","entra","sale"] + COLS_ANOTACION]
+        .astype({"minuto": int, "entra": str, "sale": str})
+        .drop_duplicates(subset=["minuto","entra","sale"])
+    )
+    out = base.drop(columns=COLS_ANOTACION).merge(prev, on=["minuto","entra","sale"], how="left")
+    out[COLS_ANOTACION] = out[COLS_ANOTACION].fillna("")
+    return out[list(base.columns)]
+
+# =========================
+# Matrices dispersas (COO)
+# =========================
+def matriz_vacia(tipo: str) -> dict:
+    n = len(TIPOS[tipo][2])
+    return {
+        "tipo": tipo, "shape": (n, n),
+        "filas": np.zeros(0, dtype=np.int16), "cols": np.zeros(0, dtype=np.int16),
+        "n": np.zeros(0, dtype=np.int32),
+        "goles_favor": np.zeros(0, dtype=np.int32), "goles_contra": np.zeros(0, dtype=np.int32),
+        "delta_puntos": np.zeros(0, dtype=np.int32),
+    }
+
+def _codificar(df: pd.DataFrame, tipo: str) -> pd.DataFrame:
+    col_a, col_b, ejes = TIPOS[tipo]
+    idx = {v: i for i, v in enumerate(ejes)}
+    out = df.copy()
+    out["i"] = out[col_a].fillna("").astype(str).str.strip().map(idx)
+    out["j"] = out[col_b].fillna("").astype(str).str.strip().map(idx)
+    return out.dropna(subset=["i","j"]).astype({"i": int, "j": int})
+
+def _expandir_rollups(df: pd.DataFrame) -> pd.DataFrame:
+    # Cada cambio cuenta en su celda exacta y en los totales por rival / game state,
+    # así las consultas de temporada son una búsqueda y no un recorrido de filas.
+    niveles = [
+        df,
+        df.assign(rival=TODOS),
+        df.assign(game_state=TODOS),
+        df.assign(rival=TODOS, game_state=TODOS),
+    ]
+    return pd.concat(niveles, ignore_index=True)
+
+def construir_matrices(df: pd.DataFrame, tipo: str) -> dict:
+    if df.empty:
+        return {}
+    cod = _codificar(df, tipo)
+    if cod.empty:
+        return {}
+    cod = _expandir_rollups(cod)
+    agg = (
+        cod.groupby(["equipo_cambio","rival","game_state","i","j"], sort=True)
+        .agg(n=("i","size"),
+             goles_favor=("goles_mi_equipo_post","sum"),
+             goles_contra=("goles_rival_post","sum"),
+             delta_puntos=("delta_puntos","sum"))
+        .reset_index()
+    )
+    matrices = {}
+    for key, g in agg.groupby(["equipo_cambio","rival","game_state"], sort=False):
+        m = matriz_vacia(tipo)
+        m["filas"] = g["i"].to_numpy(dtype=np.int16)
+        m["cols"] = g["j"].to_numpy(dtype=np.int16)
+        for c in ["n","goles_favor","goles_contra","delta_puntos"]:
+            m[c] = g[c].to_numpy(dtype=np.int32)
+        matrices[key] = m
+    return matrices
+
+def _resumen_formaciones(df: pd.DataFrame) -> dict:
+    # Un partido cuenta una sola vez, bajo la formacion_antes de su primer cambio anotado.
+    if df.empty:
+        return {}
+    usos = df.assign(form=df["formacion_antes"].fillna("").astype(str).str.strip())
+    usos = usos[usos["form"] != ""]
+    if usos.empty:
+        return {}
+    usos = (
+        usos.sort_values(["equipo_cambio","partido","minuto_cambio"], kind="stable")
+        .drop_duplicates(subset=["equipo_cambio","partido"], keep="first")
+    )
+    usos = usos.assign(
+        v=(usos["puntos_finales"] == 3).astype(int),
+        e=(usos["puntos_finales"] == 1).astype(int),
+        d=(usos["puntos_finales"] == 0).astype(int),
+    )
+    agg = (
+        usos.groupby(["equipo_cambio","form"], sort=False)
+        .agg(pj=("partido","size"), v=("v","sum"), e=("e","sum"), d=("d","sum"),
+             pts=("puntos_finales","sum"), gf=("gf_final","sum"), gc=("gc_final","sum"))
+        .reset_index()
+    )
+    return {
+        (r["equipo_cambio"], r["form"]): {k: int(r[k]) for k in ["pj","v","e","d","pts","gf","gc"]}
+        for _, r in agg.iterrows()
+    }
+
+def construir_rollups(df_temporada: pd.DataFrame) -> dict:
+    df = df_temporada.copy()
+    for col in COLS_TEMPORADA:
+        if col not in df.columns:
+            df[col] = 0 if col in ("minuto_cambio","goles_mi_equipo_post","goles_rival_post",
+                                   "delta_puntos","puntos_finales","gf_final","gc_final") else ""
+    return {
+        "formacion": construir_matrices(df, "formacion"),
+        "posicion": construir_matrices(df, "posicion"),
+        "resumen_formaciones": _resumen_formaciones(df),
+        "equipos": sorted(df["equipo_cambio"].dropna().unique().tolist()),
+        "rivales": sorted(df["rival"].dropna().unique().tolist()),
+        "partidos": int(df["partido"].nunique()),
+    }
+
+# =========================
+# Consultas
+# =========================
+def consultar(rollups: dict, tipo: str, equipo: str, rival: str = TODOS, game_state: str = TODOS) -> dict:
+    return rollups.get(tipo, {}).get((equipo, rival, game_state)) or matriz_vacia(tipo)
+
+def a_densa(m: dict) -> np.ndarray:
+    dense = np.zeros(m["shape"], dtype=np.int32)
+    dense[m["filas"], m["cols"]] = m["n"]
+    return dense
+
+def a_tabla(m: dict) -> pd.DataFrame:
+    ejes = TIPOS[m["tipo"]][2]
+    cols = ["antes","despues","n","goles_favor","goles_contra",
+            "goles_favor_prom","goles_contra_prom","delta_puntos_prom"]
+    if len(m["n"]) == 0:
+        return pd.DataFrame(columns=cols)
+    n = m["n"].astype(float)
+    df = pd.DataFrame({
+        "antes": [ejes[i] for i in m["filas"]],
+        "despues": [ejes[j] for j in m["cols"]],
+        "n": m["n"],
+        "goles_favor": m["goles_favor"],
+        "goles_contra": m["goles_contra"],
+        "goles_favor_prom": np.round(m["goles_favor"] / n, 2),
+        "goles_contra_prom": np.round(m["goles_contra"] / n, 2),
+        "delta_puntos_prom": np.round(m["delta_puntos"] / n, 2),
+    })
+    return df[cols].sort_values(["n","delta_puntos_prom"], ascending=[False, False]).reset_index(drop=True)
+
+def bloque_formaciones_dashboard(rollups: dict, equipo: str) -> list[dict]:
+    # Mismo formato que `formaciones` en dashboard/src/App.jsx: un partido por formación
+    # (la de inicio); las transiciones sólo se describen en `contexto`.
+    m = consultar(rollups, "formacion", equipo)
+    ejes = FORMACIONES
+    out = []
+    for (eq, form), r in rollups.get("resumen_formaciones", {}).items():
+        if eq != equipo:
+            continue
+        i = ejes.index(form) if form in ejes else -1
+        sel = (m["filas"] == i) & (m["cols"] != i)
+        salidas = sorted(zip(m["n"][sel], m["cols"][sel]), reverse=True)[:2]
+        if salidas:
+            contexto = "Cambió a " + " · ".join(f"{ejes[j]} ×{int(n)}" for n, j in salidas)
+        else:
+            contexto = "Sin cambios de sistema desde esta formación"
+        out.append({"form": form, **r, "contexto": contexto})
+    return sorted(out, key=lambda f: (-f["pj"], -f["pts"]))
@@ -6,6 +6,12 @@ import re
 import pandas as pd
 from collections import Counter
 import matplotlib.pyplot as plt
+import json
+import hashlib
+from analisis_formaciones import (
+    FORMACIONES, POS_OPTS, GAME_STATES, GANANDO, EMPATANDO, PERDIENDO, TODOS, COLS_TEMPORADA,
+    tiene_anotaciones, sembrar_anotaciones, construir_rollups, consultar, a_densa, a_tabla, bloque_formaciones_dashboard
+)
 
 # =========================
 # Configuración
@@ -150,6 +156,8 @@ uploaded_file = st.file_uploader("Subir PDF", type=["pdf"])
 
 if uploaded_file is not None:
     st.success(f"Archivo subido: {uploaded_file.name}")
+    # Identificador del partido en la temporada: contenido del PDF, no nombre ni asignación de equipos
+    partido_id = "pdf-" + hashlib.sha1(uploaded_file.getvalue()).hexdigest()[:10]
     try:
         # ---------- lectura PDF ----------
         with pdfplumber.open(uploaded_file) as pdf:
@@ -287,10 +295,6 @@ if uploaded_file is not None:
             st.info("No hay sustituciones para anotar.")
             df_subs_with_notes = df_subs_edit.copy()
         else:
-            FORMACIONES = [
-                "1-4-4-2 (doble contención)","1-4-4-2 (diamante)","1-4-3-3","1-4-2-3-1",
-                "1-3-5-2","1-5-3-2","1-5-4-1","Otro"
-            ]
             INT_CATS = {
                 "Estratégicas / de planteamiento":[
                     "Presionar","Todo al ataque","Contener","Cerrar marcador",
@@ -315,31 +319,6 @@ if uploaded_file is not None:
             INTENT_TO_CAT = {opt: cat for cat, opts in INT_CATS.items() for opt in opts}
             ALL_INTENT_OPTIONS = list(INTENT_TO_CAT.keys())
 
-            POSICIONES = [
-                ("POR","PORTERA"),
-                ("LAD","LATERAL DERECHA"),
-                ("LVD","LATERAL VOLANTE DERECHA"),
-                ("DCD","DEFENSA CENTRAL DERECHA"),
-                ("DCI","DEFENSA CENTRAL IZQUIERDA"),
-                ("LAI","LATERAL IZQUIERDA"),
-                ("LVI","LATERAL VOLANTE IZQUIERDA"),
-                ("MCC","MEDIOCAMPISTA CENTRAL"),
-                ("MCD","MEDIOCAMPISTA CENTRAL DEFENSIVA"),
-                ("MCO","MEDIOCAMPISTA CENTRAL OFENSIVA"),
-                ("MID","MEDIOCAMPISTA INTERIOR DERECHA"),
-                ("MII","MEDIOCAMPISTA INTERIOR IZQUIERDA"),
-                ("MVD","MEDIA VOLANTE DERECHA"),
-                ("MVI","MEDIA VOLANTE IZQUIERDA"),
-                ("EXI","EXTREMA IZQUIERDA"),
-                ("EXD","EXTREMA DERECHA"),
-                ("MEP","MEDIA PUNTA"),
-                ("DEC","DELANTERA CENTRO"),
-                ("SED","SEGUNDA DELANTERA"),
-                ("FNU","FALSA NUEVE"),
-                ("","(Sin especificar)")
-            ]
-            POS_OPTS = [p[0] for p in POSICIONES]
-
             # Firma de filas para mantener ediciones al cambiar PDF
             base_now = df_subs_edit[["minuto","entra","sale","equipo"]].copy().sort_values(["minuto","entra","sale","equipo"])
             sig_now = "|".join(base_now.astype(str).agg("||".join, axis=1))
@@ -356,6 +335,8 @@ if uploaded_file is not None:
                 base["intencion_tactica"] = ""
                 base["intencion_categoria"] = ""
                 base["intencion_otro"]    = ""
+                # Si el partido ya está en la temporada, se recuperan formaciones y posiciones
+                base = sembrar_anotaciones(base, st.session_state.get("temporada_impacto", {}).get(partido_id))
                 st.session_state[key_table] = base
                 st.session_state[key_sig]   = sig_now
             else:
@@ -498,24 +479,18 @@ if uploaded_file is not None:
             my_final, opp_final = score_series[-1][1], score_series[-1][2]
         puntos_finales = puntos(my_final, opp_final)
 
-        impacto_rows = []
-        if not df_subs_edit.empty:
-            merged = df_subs_edit.merge(
-                df_subs_with_notes if 'df_subs_with_notes' in locals() else df_subs_edit.assign(
-                    formacion_antes="", formacion_despues="", intencion_tactica="", intencion_categoria="", intencion_otro="",
-                    pos_entra="", pos_sale=""
-                ),
-                on=["minuto","entra","sale","equipo"], how="left"
-            )
-            subs_my = merged[merged["equipo"] == my_team].copy().reset_index(drop=True)
-
-            for _, row in subs_my.iterrows():
+        # Filas de impacto desde la perspectiva de `equipo` (marcador, puntos y goles de su lado)
+        def filas_impacto(subs_team: pd.DataFrame, equipo: str, rival: str) -> list[dict]:
+            gf_eq, gc_eq = (my_final, opp_final) if equipo == my_team else (opp_final, my_final)
+            filas = []
+            for _, row in subs_team.iterrows():
                 t = int(row["minuto"]); w_end = t + int(ventana_min)
-                my_t, opp_t = score_at(score_series, t)
+                a, b = score_at(score_series, t)
+                my_t, opp_t = (a, b) if equipo == my_team else (b, a)
                 pm = puntos(my_t, opp_t)
-                game_state = "Ganando" if my_t > opp_t else ("Perdiendo" if my_t < opp_t else "Empatando")
+                game_state = GANANDO if my_t > opp_t else (PERDIENDO if my_t < opp_t else EMPATANDO)
 
-                pf = puntos_finales
+                pf = puntos(gf_eq, gc_eq)
                 if   pm==0 and pf==3: etiqueta="IMPACTO MUY POSITIVO"
                 elif pm==0 and pf==1: etiqueta="IMPACTO MEDIO"
                 elif pm==0 and pf==0: etiqueta="IMPACTO NEUTRO"
@@ -528,22 +503,22 @@ if uploaded_file is not None:
                 else: etiqueta="IMPACTO (revisar)"
 
                 my_post=opp_post=0
-                if 'df_goles_edit' in locals() and not df_goles_edit.empty:
+                if not df_goles_edit.empty:
                     for _,g in df_goles_edit.iterrows():
                         gm=int(g["minuto"])
                         if t < gm <= w_end:
-                            if g["equipo"]==my_team: my_post+=1
-                            elif g["equipo"]==opp_team: opp_post+=1
+                            if g["equipo"]==equipo: my_post+=1
+                            elif g["equipo"]==rival: opp_post+=1
 
                 inten = row.get("intencion_tactica","")
                 if inten == "Otro":
                     inten = row.get("intencion_otro","Otro")
 
-                impacto_rows.append({
+                filas.append({
                     "minuto_cambio": t,
                     "entra": row["entra"],
                     "sale": row["sale"],
-                    "equipo_cambio": my_team,
+                    "equipo_cambio": equipo,
                     "pos_entra": row.get("pos_entra",""),
                     "pos_sale": row.get("pos_sale",""),
                     "formacion_antes": row.get("formacion_antes",""),
@@ -561,6 +536,23 @@ if uploaded_file is not None:
                     "goles_rival_post": opp_post,
                     "impacto_ventana": my_post-opp_post
                 })
+            return filas
+
+        impacto_rows, impacto_rows_rival = [], []
+        if not df_subs_edit.empty:
+            merged = df_subs_edit.merge(
+                df_subs_with_notes if 'df_subs_with_notes' in locals() else df_subs_edit.assign(
+                    formacion_antes="", formacion_despues="", intencion_tactica="", intencion_categoria="", intencion_otro="",
+                    pos_entra="", pos_sale=""
+                ),
+                on=["minuto","entra","sale","equipo"], how="left"
+            )
+            subs_my = merged[merged["equipo"] == my_team].copy().reset_index(drop=True)
+
+            impacto_rows = filas_impacto(subs_my, my_team, opp_team)
+            impacto_rows_rival = filas_impacto(
+                merged[merged["equipo"] == opp_team].copy().reset_index(drop=True), opp_team, my_team
+            )
 
         cols = ["minuto_cambio","entra","sale","pos_entra","pos_sale","equipo_cambio",
                 "formacion_antes","formacion_despues","intencion_categoria","intencion_tactica",
@@ -568,12 +560,136 @@ if uploaded_file is not None:
                 "delta_puntos","etiqueta_impacto_puntos",
                 "ventana_min","goles_mi_equipo_post","goles_rival_post","impacto_ventana"]
         df_impacto = pd.DataFrame(impacto_rows)[cols] if impacto_rows else pd.DataFrame(columns=cols)
+        df_impacto_rival = pd.DataFrame(impacto_rows_rival)[cols] if impacto_rows_rival else pd.DataFrame(columns=cols)
 
         if not df_impacto.empty:
             st.dataframe(df_impacto.sort_values("minuto_cambio"), use_container_width=True, hide_index=True)
         else:
             st.info("Completa las **anotaciones** y la asignación de equipos para ver el impacto.")
 
+        # =========================
+        # Transiciones de formación y posición (temporada)
+        # =========================
+        st.divider()
+        st.subheader("Transiciones de formación y posición")
+
+        # Cada partido procesado queda acumulado en sesión (se reemplaza si se vuelve a anotar).
+        # `temporada_version` sólo sube cuando cambian esas filas; los rollups se
+        # reconstruyen únicamente cuando su versión no coincide.
+        key_temp = "temporada_impacto"
+        key_ver  = "temporada_version"
+        # El reinicio va antes de insertar: la temporada queda sólo con el partido cargado
+        if st.button("Reiniciar temporada (conserva sólo el partido actual)"):
+            for k in [key_temp, "temporada_rollups", "temporada_rollups_version", "temporada_csv"]:
+                st.session_state.pop(k, None)
+            st.session_state[key_ver] = st.session_state.get(key_ver, 0) + 1
+        if key_temp not in st.session_state:
+            st.session_state[key_temp] = {}
+
+        # Entran los cambios de ambos equipos, cada uno con marcador y goles desde su lado.
+        # Cambiar equipos o rival reemplaza la entrada del mismo partido (partido_id).
+        if not (df_impacto.empty and df_impacto_rival.empty):
+            filas_partido = pd.concat([
+                df_impacto.assign(rival=opp_team, gf_final=my_final, gc_final=opp_final),
+                df_impacto_rival.assign(rival=my_team, gf_final=opp_final, gc_final=my_final),
+            ], ignore_index=True).assign(partido=partido_id)[COLS_TEMPORADA]
+            # Filas sin formaciones ni posiciones no sustituyen lo ya guardado (p. ej. tras cargar CSV)
+            previo = st.session_state[key_temp].get(partido_id)
+            if tiene_anotaciones(filas_partido) and (previo is None or not previo.equals(filas_partido)):
+                st.session_state[key_temp][partido_id] = filas_partido
+                st.session_state[key_ver] = st.session_state.get(key_ver, 0) + 1
+
+        # Temporadas guardadas en CSV (mismas columnas que COLS_TEMPORADA) para otras sesiones
+        csv_up = st.file_uploader("Cargar temporada (CSV)", type=["csv"], key="temporada_csv_up")
+        if csv_up is not None and st.session_state.get("temporada_csv_cargado") != (csv_up.name, csv_up.size):
+            df_csv = pd.read_csv(csv_up)
+            faltan = [c for c in COLS_TEMPORADA if c not in df_csv.columns]
+            if faltan:
+                st.warning("El CSV no tiene las columnas: " + ", ".join(faltan))
+            else:
+                df_csv = df_csv[COLS_TEMPORADA]
+                for col in ["partido","equipo_cambio","rival","entra","sale","game_state",
+                            "formacion_antes","formacion_despues","pos_sale","pos_entra"]:
+                    df_csv[col] = df_csv[col].fillna("").astype(str)
+                for pid, g in df_csv.groupby("partido", sort=False):
+                    st.session_state[key_temp][pid] = g.reset_index(drop=True)
+                st.session_state[key_ver] = st.session_state.get(key_ver, 0) + 1
+            st.session_state["temporada_csv_cargado"] = (csv_up.name, csv_up.size)
+
+        partidos_temp = st.session_state[key_temp]
+        if not partidos_temp:
+            st.info("Captura formaciones y posiciones en las anotaciones para construir las transiciones.")
+        else:
+            version = st.session_state.get(key_ver, 0)
+            if st.session_state.get("temporada_rollups_version") != version:
+                df_temp = pd.concat(partidos_temp.values(), ignore_index=True)
+                st.session_state["temporada_rollups"]         = construir_rollups(df_temp)
+                st.session_state["temporada_csv"]             = df_temp.to_csv(index=False)
+                st.session_state["temporada_rollups_version"] = version
+            rollups = st.session_state["temporada_rollups"]
+
+            st.caption(f"Partidos acumulados: {rollups['partidos']}")
+            st.download_button(
+                "Descargar temporada (CSV)", st.session_state["temporada_csv"],
+                file_name="temporada_transiciones.csv", mime="text/csv"
+            )
+
+            colt1, colt2, colt3, colt4 = st.columns(4)
+            with colt1:
+                equipo_tr = st.selectbox(
+                    "Equipo", options=rollups["equipos"], key="tr_equipo",
+                    index=rollups["equipos"].index(my_team) if my_team in rollups["equipos"] else 0
+                )
+            with colt2:
+                rival_tr = st.selectbox("Rival", options=[TODOS] + rollups["rivales"], index=0, key="tr_rival")
+            with colt3:
+                estado_tr = st.selectbox("Game state", options=[TODOS] + GAME_STATES, index=0, key="tr_estado")
+            with colt4:
+                tipo_tr = st.radio("Matriz", options=["formacion", "posicion"], horizontal=True, key="tr_tipo",
+                                   format_func=lambda t: "Formación" if t == "formacion" else "Posición")
+
+            mat = consultar(rollups, tipo_tr, equipo_tr, rival_tr, estado_tr)
+            tabla_tr = a_tabla(mat)
+
+            if tabla_tr.empty:
+                st.info("Sin transiciones para los filtros actuales.")
+            else:
+                c1, c2 = st.columns(2)
+                with c1:
+                    # Sólo filas/columnas con datos para que el mapa sea legible
+                    dense = a_densa(mat)
+                    filas = sorted(set(mat["filas"].tolist()))
+                    cols_m = sorted(set(mat["cols"].tolist()))
+                    ejes = FORMACIONES if tipo_tr == "formacion" else [p for p in POS_OPTS if p]
+                    sub = dense[filas][:, cols_m]
+
+                    fig3, ax3 = plt.subplots(figsize=(6.5, 5.5))
+                    ax3.imshow(sub, cmap="YlOrBr")
+                    ax3.set_xticks(range(len(cols_m)))
+                    ax3.set_xticklabels([ejes[j] for j in cols_m], rotation=45, ha="right")
+                    ax3.set_yticks(range(len(filas)))
+                    ax3.set_yticklabels([ejes[i] for i in filas])
+                    ax3.set_xlabel("Después" if tipo_tr == "formacion" else "Entra")
+                    ax3.set_ylabel("Antes" if tipo_tr == "formacion" else "Sale")
+                    for yi in range(len(filas)):
+                        for xj in range(len(cols_m)):
+                            if sub[yi, xj]:
+                                ax3.text(xj, yi, str(sub[yi, xj]), ha="center", va="center")
+                    ax3.set_title(f"Transiciones — {equipo_tr}")
+                    st.pyplot(fig3, clear_figure=True)
+                with c2:
+                    st.dataframe(tabla_tr, use_container_width=True, hide_index=True)
+
+            bloque = bloque_formaciones_dashboard(rollups, equipo_tr)
+            if bloque:
+                with st.expander("Bloque `formaciones` para el dashboard"):
+                    bloque_json = json.dumps(bloque, ensure_ascii=False, indent=2)
+                    st.code(bloque_json, language="json")
+                    st.download_button(
+                        "Descargar formaciones.json", bloque_json,
+                        file_name=f"formaciones_{equipo_tr}.json", mime="application/json"
+                    )
+
         # =========================
         # Gráfico: distribución de intenciones tácticas
         # =========================
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+from analisis_formaciones import (
+    COLS_ANOTACION, COLS_TEMPORADA, GAME_STATES, TODOS,
+    a_densa, bloque_formaciones_dashboard, construir_rollups, consultar,
+    sembrar_anotaciones, tiene_anotaciones
+)
+
+
+def fila(**kw):
+    base = {
+        "partido": "p1", "equipo_cambio": "Pumas", "rival": "Toluca", "minuto_cambio": 60,
+        "entra": "Ana", "sale": "Bea",
+        "game_state": "Empatando", "formacion_antes": "1-4-3-3", "formacion_despues": "1-4-2-3-1",
+        "pos_sale": "EXI", "pos_entra": "MEP", "goles_mi_equipo_post": 0, "goles_rival_post": 0,
+        "delta_puntos": 0, "puntos_finales": 1, "gf_final": 1, "gc_final": 1,
+    }
+    base.update(kw)
+    return base
+
+
+def temporada(filas):
+    return pd.DataFrame(filas)[COLS_TEMPORADA]
+
+
+def test_filas_vacias_no_entran_en_la_matriz():
+    df = temporada([
+        fila(),
+        fila(formacion_antes="", pos_sale=""),
+        fila(formacion_despues=None, pos_entra=" "),
+    ])
+    r = construir_rollups(df)
+    assert int(consultar(r, "formacion", "Pumas")["n"].sum()) == 1
+    assert int(consultar(r, "posicion", "Pumas")["n"].sum()) == 1
+
+
+def test_rollup_total_es_la_suma_de_rivales_y_game_states():
+    df = temporada([
+        fila(rival="Toluca", game_state="Ganando", goles_mi_equipo_post=1, delta_puntos=2),
+        fila(rival="Toluca", game_state="Perdiendo", formacion_despues="1-5-4-1"),
+        fila(partido="p2", rival="Tigres", game_state="Ganando", goles_rival_post=2, delta_puntos=-1),
+        fila(partido="p2", rival="Tigres", game_state="Empatando", formacion_antes="1-3-5-2"),
+    ])
+    r = construir_rollups(df)
+    total = a_densa(consultar(r, "formacion", "Pumas", TODOS, TODOS))
+
+    por_rival = sum(a_densa(consultar(r, "formacion", "Pumas", rv, TODOS)) for rv in r["rivales"])
+    por_estado = sum(a_densa(consultar(r, "formacion", "Pumas", TODOS, gs)) for gs in GAME_STATES)
+    por_celda = sum(
+        a_densa(consultar(r, "formacion", "Pumas", rv, gs)) for rv in r["rivales"] for gs in GAME_STATES
+    )
+    assert np.array_equal(total, por_rival)
+    assert np.array_equal(total, por_estado)
+    assert np.array_equal(total, por_celda)
+
+    m = consultar(r, "formacion", "Pumas")
+    assert int(m["goles_favor"].sum()) == 1
+    assert int(m["goles_contra"].sum()) == 2
+    assert int(m["delta_puntos"].sum()) == 1
+
+
+def test_bloque_dashboard_cuenta_un_partido_por_formacion():
+    df = temporada([
+        # p1: victoria; el primer cambio (min 55) parte de 1-4-3-3
+        fila(partido="p1", minuto_cambio=70, formacion_antes="1-4-2-3-1", formacion_despues="1-5-4-1",
+             puntos_finales=3, gf_final=2, gc_final=1),
+        fila(partido="p1", minuto_cambio=55, formacion_antes="1-4-3-3", formacion_despues="1-4-2-3-1",
+             puntos_finales=3, gf_final=2, gc_final=1),
+        # p2: empate, mismo sistema de inicio
+        fila(partido="p2", minuto_cambio=60, formacion_antes="1-4-3-3", formacion_despues="1-4-3-3",
+             puntos_finales=1, gf_final=0, gc_final=0),
+        # p3: derrota con otro sistema
+        fila(partido="p3", minuto_cambio=46, formacion_antes="1-4-2-3-1", formacion_despues="1-4-2-3-1",
+             puntos_finales=0, gf_final=0, gc_final=2),
+        # cambios del rival no cuentan para Pumas
+        fila(partido="p3", equipo_cambio="Toluca", rival="Pumas", formacion_antes="1-4-3-3",
+             puntos_finales=3, gf_final=2, gc_final=0),
+    ])
+    bloque = {f["form"]: f for f in bloque_formaciones_dashboard(construir_rollups(df), "Pumas")}
+
+    assert set(bloque) == {"1-4-3-3", "1-4-2-3-1"}
+    assert sum(f["pj"] for f in bloque.values()) == 3
+    for f in bloque.values():
+        assert f["pj"] == f["v"] + f["e"] + f["d"]
+        assert f["pts"] == 3 * f["v"] + f["e"]
+
+    b433 = bloque["1-4-3-3"]
+    assert (b433["pj"], b433["v"], b433["e"], b433["d"], b433["gf"], b433["gc"]) == (2, 1, 1, 0, 2, 1)
+    assert "1-4-2-3-1" in b433["contexto"]
+    b4231 = bloque["1-4-2-3-1"]
+    assert (b4231["pj"], b4231["v"], b4231["e"], b4231["d"], b4231["gf"], b4231["gc"]) == (1, 0, 0, 1, 0, 2)
+
+
+def test_tiene_anotaciones():
+    assert tiene_anotaciones(temporada([fila()]))
+    vacias = temporada([fila(formacion_antes="", formacion_despues=None, pos_sale=" ", pos_entra="")])
+    assert not tiene_anotaciones(vacias)
+    assert not tiene_anotaciones(vacias.iloc[0:0])
+
+
+def test_sembrar_anotaciones_empata_sin_depender_del_equipo():
+    guardadas = temporada([
+        fila(minuto_cambio=60, entra="Ana", sale="Bea", formacion_antes="1-4-3-3", pos_sale="EXI"),
+        fila(minuto_cambio=75, entra="Caro", sale="Dani", formacion_antes="1-5-4-1", pos_entra="LAD"),
+    ])
+    base = pd.DataFrame({
+        "minuto": [60, 75, 80], "equipo": ["Rival", "Pumas", "Pumas"],
+        "entra": ["Ana", "Caro", "Eva"], "sale": ["Bea", "Dani", "Fer"],
+    })
+    for col in COLS_ANOTACION + ["intencion_tactica"]:
+        base[col] = ""
+
+    out = sembrar_anotaciones(base, guardadas)
+    assert list(out.columns) == list(base.columns)
+    assert list(out["equipo"]) == ["Rival", "Pumas", "Pumas"]
+    assert list(out["formacion_antes"]) == ["1-4-3-3", "1-5-4-1", ""]
+    assert list(out["pos_sale"]) == ["EXI", "EXI", ""]
+    assert list(out["pos_entra"]) == ["MEP", "LAD", ""]
+    assert sembrar_anotaciones(base, None) is base